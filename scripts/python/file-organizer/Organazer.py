@@ -1,41 +1,204 @@
+import atexit
+import errno
 import hashlib
 import json
 import logging
+import mmap
+import os
+import queue
 import shutil
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import xxhash  # Необязательная зависимость: заметно быстрее hashlib
+except ImportError:
+    xxhash = None
+
+try:
+    import orjson  # Необязательная зависимость: быстрая сериализация отчета
+except ImportError:
+    orjson = None
+
+# Размер начала файла для предварительного хеширования
+PREFIX_HASH_SIZE = 65536
+# Группы одного размера больше этого значения сначала фильтруются по хешу начала файла
+PREFIX_FILTER_MIN_FILES = 3
+# Файлы меньше этого размера сравниваются по самому содержимому, без хеширования
+SMALL_FILE_SIZE = 4096
+# Меньше этого числа файлов обрабатываем последовательно: пул потоков не окупается
+PARALLEL_READ_MIN_FILES = 4
 
 
 def setup_logging():
-    """Настройка логирования"""
+    """
+    Настройка логирования.
+    Запись в файл выполняется в фоновом потоке через очередь, чтобы не тормозить обработку файлов.
+    Консольный вывод остается синхронным, чтобы не перемешиваться с print().
+    """
+    root_logger = logging.getLogger()
+    if root_logger.handlers:
+        # Логирование уже настроено (как и basicConfig, повторный вызов ничего не делает)
+        return
+
     log_file = Path.home() / 'Downloads' / 'file_organizer.log'
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
 
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.addHandler(stream_handler)
 
-def get_file_hash(file_path: Path, buffer_size: int = 65536) -> str:
+
+def new_file_hasher():
+    """
+    Создает объект для хеширования содержимого файлов.
+    Криптостойкость не нужна, поэтому вместо MD5 используется xxHash3 (если установлен) или BLAKE2b.
     """
-    Вычисляет MD5 хеш файла для сравнения содержимого.
+    if xxhash is not None:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def get_file_digest(file_path: Path, buffer_size: int = 1048576) -> bytes:
+    """
+    Вычисляет хеш файла для сравнения содержимого.
     Используется для обнаружения точных дубликатов.
+    Возвращает сырые байты дайджеста (в два раза компактнее hex-строки).
     """
-    md5_hash = hashlib.md5()
+    try:
+        with open(file_path, 'rb') as f:
+            # Python 3.11+: стандартная функция читает файл в переиспользуемый буфер без лишних копий
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, new_file_hasher).digest()
+
+            file_hash = new_file_hasher()
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    file_hash.update(mm)
+            except (ValueError, OSError):
+                # Пустые файлы и некоторые ФС не поддерживают mmap - читаем блоками
+                while chunk := f.read(buffer_size):
+                    file_hash.update(chunk)
+    except (IOError, OSError) as e:
+        logging.warning(f"Не удалось вычислить хеш для {file_path}: {e}")
+        return b""
+
+    return file_hash.digest()
+
+
+def get_prefix_digest(file_path: Path, prefix_size: int = PREFIX_HASH_SIZE) -> bytes:
+    """
+    Вычисляет хеш только начала файла.
+    Дешевый предварительный фильтр перед хешированием всего файла.
+    """
+    prefix_hash = new_file_hasher()
 
     try:
         with open(file_path, 'rb') as f:
-            while chunk := f.read(buffer_size):
-                md5_hash.update(chunk)
+            prefix_hash.update(f.read(prefix_size))
     except (IOError, OSError) as e:
         logging.warning(f"Не удалось вычислить хеш для {file_path}: {e}")
-        return ""
+        return b""
+
+    return prefix_hash.digest()
+
+
+def compare_file_contents(file1: Path, file2: Path, buffer_size: int = 65536) -> bool:
+    """
+    Побайтово сравнивает два файла одинакового размера, прерываясь на первом отличии.
+    В отличие от filecmp.cmp не вызывает stat() повторно - размеры уже сверены вызывающим кодом.
+    """
+    try:
+        with open(file1, 'rb') as f1, open(file2, 'rb') as f2:
+            while True:
+                chunk1 = f1.read(buffer_size)
+                if chunk1 != f2.read(buffer_size):
+                    return False
+                if not chunk1:
+                    return True
+    except (IOError, OSError) as e:
+        logging.warning("Не удалось сравнить %s и %s: %s", file1, file2, e)
+        return False
+
+
+def read_small_file(file_path: Path) -> bytes:
+    """
+    Читает небольшой файл целиком.
+    Для небольших файлов содержимое само служит ключом для поиска дубликатов, хешировать его незачем.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read()
+    except (IOError, OSError) as e:
+        logging.warning("Не удалось прочитать %s: %s", file_path, e)
+        return b""
+
+
+def read_files(paths: List[Path], read_func: Optional[Callable[[Path], bytes]] = None) -> Dict[Path, bytes]:
+    """
+    Применяет read_func к каждому файлу в пуле потоков: считает дайджест (по умолчанию),
+    хеш начала файла или читает содержимое небольших файлов.
+    Чтение файлов и hashlib освобождают GIL, поэтому потоки работают параллельно.
+    Возвращает словарь: путь -> результат read_func (пустые байты при ошибке)
+    """
+    read_func = read_func or get_file_digest
+    results = {}
 
-    return md5_hash.hexdigest()
+    if len(paths) < PARALLEL_READ_MIN_FILES:
+        for file_path in paths:
+            try:
+                results[file_path] = read_func(file_path)
+            except Exception as e:
+                logging.warning("Не удалось прочитать файл %s: %s", file_path, e)
+                results[file_path] = b""
+        return results
+
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(read_func, file_path): file_path for file_path in paths}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                results[file_path] = future.result()
+            except Exception as e:
+                logging.warning("Не удалось прочитать файл %s: %s", file_path, e)
+                results[file_path] = b""
+
+    return results
+
+
+def scan_files(folder: Path, recursive: bool = True) -> Iterator[os.DirEntry]:
+    """
+    Обходит папку через os.scandir и возвращает DirEntry обычных файлов.
+    DirEntry кэширует тип и результат stat(), что избавляет от лишних системных вызовов.
+    """
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        yield entry
+                    elif recursive and entry.is_dir(follow_symlinks=False):
+                        yield from scan_files(Path(entry.path), recursive)
+                except OSError as e:
+                    logging.warning(f"Не удалось прочитать {entry.path}: {e}")
+    except OSError as e:
+        logging.warning(f"Не удалось открыть папку {folder}: {e}")
 
 
 def get_category_mappings() -> Dict[str, List[str]]:
@@ -63,6 +226,14 @@ class FileOrganizer:
         self.source_folder = source_folder or Path.home() / 'Downloads'
         self.dry_run = dry_run
         self.categories = get_category_mappings()
+        # Обратное отображение расширение -> категория.
+        # Если расширение есть в нескольких категориях, побеждает первая (как и раньше при переборе)
+        self.ext_to_category: Dict[str, str] = {}
+        for category, extensions in self.categories.items():
+            for ext in extensions:
+                self.ext_to_category.setdefault(ext, category)
+        self.known_extensions = frozenset(self.ext_to_category)
+        self.suffix_map: Dict[str, Optional[str]] = {}  # Кэш: исходный суффикс -> категория
         self.stats = {
             'processed': 0,
             'moved': 0,
@@ -72,41 +243,44 @@ class FileOrganizer:
             'errors': 0,
             'skipped': 0
         }
-        self.hash_cache = {}  # Кэш для хешей файлов
-        self.name_cache = {}  # Кэш для имен файлов (без учета регистра)
+        self.hash_cache: Dict[Path, bytes] = {}  # Кэш для дайджестов файлов
+        self.name_cache: Dict[Path, Set[str]] = {}  # Кэш для имен файлов (без учета регистра)
+        self.entry_name_cache: Dict[Path, Set[str]] = {}  # Кэш для имен всех записей папки (без учета регистра)
+        self.stat_cache: Dict[Path, os.stat_result] = {}  # Кэш для stat() файлов
+        self.compare_counts: Dict[Path, int] = defaultdict(int)  # Сколько раз файл участвовал в сравнении
 
     def get_unique_filename(self, file_path: Path, target_folder: Path) -> Optional[Path]:
         """
         Генерирует уникальное имя файла, если файл с таким именем уже существует.
         Возвращает путь с уникальным именем.
         """
-        original_name = file_path.name
-        name_parts = original_name.rsplit('.', 1)
-        base_name = name_parts[0]
-        extension = f".{name_parts[1]}" if len(name_parts) > 1 else ""
+        names = self.get_entry_names(target_folder)
+        base_name = file_path.stem
+        extension = file_path.suffix
 
         counter = 1
-        new_name = original_name
+        new_name = file_path.name
         new_path = target_folder / new_name
 
-        # Проверяем существование файла
-        while new_path.exists():
+        # Проверяем существование файла: сначала по кэшу имен, stat() только при совпадении
+        while new_name.lower() in names and new_path.exists():
             # Проверяем, является ли файл точным дубликатом
             if self.is_exact_duplicate(file_path, new_path):
-                logging.info(f"Найден точный дубликат: {file_path.name} -> {new_path.name}")
+                logging.info("Найден точный дубликат: %s -> %s", file_path.name, new_path.name)
                 self.stats['duplicates_found'] += 1
 
                 # Удаляем дубликат в зависимости от настроек
                 if not self.dry_run:
                     try:
                         file_path.unlink()
+                        self.forget_file(file_path)
                         self.stats['duplicates_removed'] += 1
-                        logging.info(f"Удален дубликат: {file_path.name}")
+                        logging.info("Удален дубликат: %s", file_path.name)
                     except Exception as e:
-                        logging.error(f"Не удалось удалить дубликат {file_path.name}: {e}")
+                        logging.error("Не удалось удалить дубликат %s: %s", file_path.name, e)
                         self.stats['errors'] += 1
                 else:
-                    logging.info(f"[DRY RUN] Был бы удален дубликат: {file_path.name}")
+                    logging.info("[DRY RUN] Был бы удален дубликат: %s", file_path.name)
 
                 return None  # Файл-дубликат, не нужно перемещать
 
@@ -124,41 +298,95 @@ class FileOrganizer:
 
         return new_path
 
+    def get_file_stat(self, file_path: Path) -> os.stat_result:
+        """Возвращает stat() файла, кэшируя результат до перемещения или удаления файла"""
+        file_stat = self.stat_cache.get(file_path)
+        if file_stat is None:
+            file_stat = file_path.stat()
+            self.stat_cache[file_path] = file_stat
+        return file_stat
+
+    def forget_file(self, file_path: Path):
+        """Сбрасывает кэшированные данные о файле после его перемещения или удаления"""
+        self.stat_cache.pop(file_path, None)
+        self.hash_cache.pop(file_path, None)
+        self.compare_counts.pop(file_path, None)
+
     def is_exact_duplicate(self, file1: Path, file2: Path) -> bool:
         """
         Проверяет, являются ли два файла точными дубликатами.
-        Сначала сравнивает размер, затем хеш содержимого.
+        Сначала сравнивает размер, затем содержимое: побайтово при первом сравнении,
+        по хешу - если файл сравнивается повторно и хеш окупится.
         """
-        # Быстрая проверка по размеру
+        # Быстрая проверка по размеру (stat() кэшируется)
         try:
-            if file1.stat().st_size != file2.stat().st_size:
+            if self.get_file_stat(file1).st_size != self.get_file_stat(file2).st_size:
                 return False
         except (OSError, IOError):
             return False
 
+        self.compare_counts[file1] += 1
+        self.compare_counts[file2] += 1
+
+        # Разовое сравнение: побайтовое чтение прерывается на первом отличии
+        if (file1 not in self.hash_cache and file2 not in self.hash_cache
+                and self.compare_counts[file1] < 2 and self.compare_counts[file2] < 2):
+            return compare_file_contents(file1, file2)
+
         # Проверка по хешу
         hash1 = self.hash_cache.get(file1)
         if hash1 is None:
-            hash1 = get_file_hash(file1)
+            hash1 = get_file_digest(file1)
             self.hash_cache[file1] = hash1
 
         hash2 = self.hash_cache.get(file2)
         if hash2 is None:
-            hash2 = get_file_hash(file2)
+            hash2 = get_file_digest(file2)
             self.hash_cache[file2] = hash2
 
-        return hash1 and hash2 and hash1 == hash2
+        return bool(hash1) and hash1 == hash2
 
-    @staticmethod
-    def check_case_insensitive_duplicate(filename: str, target_folder: Path) -> bool:
+    def load_folder_names(self, folder: Path):
+        """
+        Сканирует папку один раз и кэширует имена в нижнем регистре:
+        отдельно имена файлов и имена всех записей (файлы, папки и т.д.).
+        """
+        file_names = set()
+        entry_names = set()
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    name = entry.name.lower()
+                    entry_names.add(name)
+                    if entry.is_file():
+                        file_names.add(name)
+        except FileNotFoundError:
+            # В режиме предпросмотра папка категории может еще не существовать
+            pass
+        self.name_cache[folder] = file_names
+        self.entry_name_cache[folder] = entry_names
+
+    def get_lowercase_names(self, folder: Path) -> Set[str]:
+        """Возвращает имена файлов папки в нижнем регистре (с кэшированием)"""
+        if folder not in self.name_cache:
+            self.load_folder_names(folder)
+        return self.name_cache[folder]
+
+    def get_entry_names(self, folder: Path) -> Set[str]:
+        """
+        Возвращает имена всех записей папки в нижнем регистре (с кэшированием).
+        Используется для поиска коллизий имен: занятым считается и имя папки.
+        """
+        if folder not in self.entry_name_cache:
+            self.load_folder_names(folder)
+        return self.entry_name_cache[folder]
+
+    def check_case_insensitive_duplicate(self, filename: str, target_folder: Path) -> bool:
         """
         Проверяет наличие файла с тем же именем без учета регистра.
         Важно для Windows/Linux совместимости.
         """
-        for existing_file in target_folder.iterdir():
-            if existing_file.is_file() and existing_file.name.lower() == filename.lower():
-                return True
-        return False
+        return filename.lower() in self.get_lowercase_names(target_folder)
 
     def create_category_folders(self):
         """Создает папки категорий, если они не существуют"""
@@ -182,104 +410,160 @@ class FileOrganizer:
         # Создаем папки категорий
         self.create_category_folders()
 
-        # Сначала собираем все файлы для обработки
-        files_to_process = []
-        for item in self.source_folder.iterdir():
-            if item.is_file() and not item.name.startswith('.') and item.suffix != '.log':
-                files_to_process.append(item)
+        # Обрабатываем файлы по мере обхода папки, не собирая их в список
+        with os.scandir(self.source_folder) as it:
+            for entry in it:
+                if (not entry.is_file(follow_symlinks=False)
+                        or entry.name.startswith('.') or entry.name.endswith('.log')):
+                    continue
+                self.stats['processed'] += 1
+                self.process_file(Path(entry.path))
 
-        self.stats['processed'] = len(files_to_process)
+        return True
 
-        # Обрабатываем файлы
-        for file_path in files_to_process:
-            self.process_file(file_path)
+    def get_category(self, suffix: str) -> Optional[str]:
+        """
+        Возвращает категорию для суффикса файла или None для неизвестных форматов.
+        Результат кэшируется по исходному суффиксу, чтобы не вызывать lower() для каждого файла.
+        """
+        if suffix in self.suffix_map:
+            return self.suffix_map[suffix]
 
-        return True
+        file_ext = sys.intern(suffix.lower())
+        category = self.ext_to_category[file_ext] if file_ext in self.known_extensions else None
+        self.suffix_map[sys.intern(suffix)] = category
+        return category
 
     def process_file(self, file_path: Path):
         """Обрабатывает один файл"""
-        file_ext = file_path.suffix.lower()
-        moved = False
-
-        for category, extensions in self.categories.items():
-            if file_ext in extensions:
-                target_folder = self.source_folder / category
+        category = self.get_category(file_path.suffix)
 
-                # Проверяем и получаем уникальное имя
-                unique_path = self.get_unique_filename(file_path, target_folder)
+        if category is None:
+            # Файл не подошел ни под одну категорию
+            logging.debug("Неизвестный формат: %s (%s)", file_path.name, file_path.suffix)
+            self.stats['skipped'] += 1
+            return
 
-                if unique_path is None:
-                    # Файл был удален как дубликат
-                    moved = True
-                    break
+        target_folder = self.source_folder / category
 
-                # Если файл с таким именем уже существует (без учета регистра)
-                if self.check_case_insensitive_duplicate(unique_path.name, target_folder):
-                    logging.warning(f"Файл с похожим именем (регистр) уже существует: {unique_path.name}")
+        # Проверяем и получаем уникальное имя
+        unique_path = self.get_unique_filename(file_path, target_folder)
 
-                # Перемещаем файл
-                try:
-                    if not self.dry_run:
-                        shutil.move(str(file_path), str(unique_path))
-                        self.stats['moved'] += 1
-
-                        if file_path.name != unique_path.name:
-                            self.stats['renamed'] += 1
-                            logging.info(
-                                f"Перемещен с переименованием: {file_path.name} -> {category}/{unique_path.name}")
-                        else:
-                            logging.info(f"Перемещен: {file_path.name} -> {category}/")
-                    else:
-                        if file_path.name != unique_path.name:
-                            logging.info(
-                                f"[DRY RUN] Был бы перемещен с переименованием: {file_path.name} -> {category}/{unique_path.name}")
-                        else:
-                            logging.info(f"[DRY RUN] Был бы перемещен: {file_path.name} -> {category}/")
+        if unique_path is None:
+            # Файл был удален как дубликат
+            return
 
-                    moved = True
-                    break
+        # Если файл с таким именем уже существует (без учета регистра)
+        if self.check_case_insensitive_duplicate(unique_path.name, target_folder):
+            logging.warning("Файл с похожим именем (регистр) уже существует: %s", unique_path.name)
 
-                except Exception as e:
-                    logging.error(f"Ошибка при перемещении {file_path.name}: {e}")
-                    self.stats['errors'] += 1
-                    moved = True  # Помечаем как обработанный, даже с ошибкой
-                    break
+        # Перемещаем файл
+        try:
+            if not self.dry_run:
+                try:
+                    # Папки категорий лежат внутри исходной папки - обычно хватает атомарного переименования
+                    os.replace(file_path, unique_path)
+                except OSError as e:
+                    # Только другой раздел (ссылка на другую точку монтирования) требует копирования
+                    if e.errno != errno.EXDEV:
+                        raise
+                    shutil.move(str(file_path), str(unique_path))
+                self.forget_file(file_path)
+                self.get_lowercase_names(target_folder).add(unique_path.name.lower())
+                self.get_entry_names(target_folder).add(unique_path.name.lower())
+                self.stats['moved'] += 1
+
+                if file_path.name != unique_path.name:
+                    self.stats['renamed'] += 1
+
+            # Сообщение пишется для каждого файла - не собираем его, если INFO отключен
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                prefix = "[DRY RUN] Был бы перемещен" if self.dry_run else "Перемещен"
+                if file_path.name != unique_path.name:
+                    logging.info("%s с переименованием: %s -> %s/%s",
+                                 prefix, file_path.name, category, unique_path.name)
+                else:
+                    logging.info("%s: %s -> %s/", prefix, file_path.name, category)
 
-        if not moved:
-            # Файл не подошел ни под одну категорию
-            logging.debug(f"Неизвестный формат: {file_path.name} ({file_ext})")
-            self.stats['skipped'] += 1
+        except Exception as e:
+            # Файл считается обработанным, даже с ошибкой
+            logging.error("Ошибка при перемещении %s: %s", file_path.name, e)
+            self.stats['errors'] += 1
 
-    def find_all_duplicates(self, recursive: bool = True) -> Dict[str, List[Path]]:
+    def find_all_duplicates(self, recursive: bool = True) -> Dict[Tuple[int, bytes], List[Tuple[Path, os.stat_result]]]:
         """
         Находит все дубликаты файлов в исходной папке.
-        Возвращает словарь: хеш -> список путей к файлам
+        Возвращает словарь: (размер, дайджест) -> список пар (путь к файлу, stat файла).
+        Для файлов меньше SMALL_FILE_SIZE вместо дайджеста в ключе хранится само содержимое.
         """
-        duplicates = {}
-
-        # Собираем все файлы
-        if recursive:
-            all_files = list(self.source_folder.rglob('*'))
-        else:
-            all_files = list(self.source_folder.iterdir())
-
-        all_files = [f for f in all_files if f.is_file() and not f.name.startswith('.')]
+        by_size: Dict[int, List[Path]] = defaultdict(list)
+        file_stats: Dict[Path, os.stat_result] = {}
+        duplicates: Dict[Tuple[int, bytes], List[Path]] = defaultdict(list)
+
+        logging.info(f"Поиск дубликатов в {self.source_folder}...")
+        files_checked = 0
+
+        # Группируем файлы по размеру: файлы с уникальным размером не могут быть дубликатами
+        for entry in scan_files(self.source_folder, recursive):
+            if entry.name.startswith('.'):
+                continue
+            files_checked += 1
+            try:
+                file_stat = entry.stat(follow_symlinks=False)
+            except OSError as e:
+                logging.warning(f"Не удалось обработать файл {entry.path}: {e}")
+                continue
+            file_path = Path(entry.path)
+            file_stats[file_path] = file_stat
+            by_size[file_stat.st_size].append(file_path)
+
+        logging.info(f"Проверено файлов: {files_checked}")
+
+        # Хешируем только группы одного размера
+        size_groups = [(size, files) for size, files in by_size.items() if len(files) > 1]
+
+        # Большие группы крупных файлов сначала отсеиваем по хешу начала файла
+        prefix_candidates = [file_path for size, files in size_groups
+                             if len(files) > PREFIX_FILTER_MIN_FILES and size > PREFIX_HASH_SIZE
+                             for file_path in files]
+        prefix_digests = read_files(prefix_candidates, get_prefix_digest)
+
+        candidates: List[Tuple[int, Path]] = []
+        small_candidates: List[Tuple[int, Path]] = []
+        for size, files in size_groups:
+            if size == 0:
+                # Все пустые файлы одинаковы - читать и хешировать нечего
+                duplicates[(0, b"")].extend(files)
+            elif size < SMALL_FILE_SIZE:
+                small_candidates.extend((size, file_path) for file_path in files)
+            elif len(files) > PREFIX_FILTER_MIN_FILES and size > PREFIX_HASH_SIZE:
+                by_prefix = defaultdict(list)
+                for file_path in files:
+                    prefix_digest = prefix_digests[file_path]
+                    if prefix_digest:
+                        by_prefix[prefix_digest].append(file_path)
+                for group in by_prefix.values():
+                    if len(group) > 1:
+                        candidates.extend((size, file_path) for file_path in group)
+            else:
+                candidates.extend((size, file_path) for file_path in files)
 
-        # Вычисляем хеши
-        logging.info(f"Поиск дубликатов среди {len(all_files)} файлов...")
+        # Небольшие файлы группируем по содержимому
+        file_contents = read_files([file_path for _, file_path in small_candidates], read_small_file)
+        for size, file_path in small_candidates:
+            content = file_contents[file_path]
+            if content:
+                duplicates[(size, content)].append(file_path)
 
-        for file_path in all_files:
-            try:
-                file_hash = get_file_hash(file_path)
-                if file_hash:
-                    if file_hash not in duplicates:
-                        duplicates[file_hash] = []
-                    duplicates[file_hash].append(file_path)
-            except Exception as e:
-                logging.warning(f"Не удалось обработать файл {file_path}: {e}")
+        file_digests = read_files([file_path for _, file_path in candidates])
+        for size, file_path in candidates:
+            file_digest = file_digests[file_path]
+            if file_digest:
+                duplicates[(size, file_digest)].append(file_path)
 
-        # Фильтруем только дубликаты (хеши с более чем одним файлом)
-        return {h: files for h, files in duplicates.items() if len(files) > 1}
+        # Фильтруем только дубликаты (ключи с более чем одним файлом)
+        return {key: [(file_path, file_stats[file_path]) for file_path in files]
+                for key, files in duplicates.items() if len(files) > 1}
 
     def remove_duplicates(self, keep_oldest: bool = True):
         """
@@ -293,35 +577,39 @@ class FileOrganizer:
             return
 
         total_duplicates = sum(len(files) - 1 for files in duplicates.values())
-        logging.info(f"Найдено {len(duplicates)} групп дубликатов, всего {total_duplicates} файлов-дубликатов")
+        logging.info("Найдено %d групп дубликатов, всего %d файлов-дубликатов", len(duplicates), total_duplicates)
 
         removed_count = 0
 
-        for file_hash, files in duplicates.items():
-            # Сортируем файлы по времени создания
-            files_with_mtime = [(f, f.stat().st_mtime) for f in files]
-            files_with_mtime.sort(key=lambda x: x[1])
-
-            # Оставляем первый файл (самый старый или самый новый в зависимости от настроек)
-            if not keep_oldest:
-                files_with_mtime = files_with_mtime[::-1]  # Реверсируем, чтобы оставить самый новый
+        for files in duplicates.values():
+            # Выбираем файл для сохранения (самый старый или самый новый в зависимости от настроек)
+            # по stat, полученному при поиске. Полная сортировка группы не нужна - хватает min/max
+            if keep_oldest:
+                kept = min(files, key=lambda x: x[1].st_mtime)
+            else:
+                # При равном времени оставляем последний файл группы, как и раньше
+                kept = max(reversed(files), key=lambda x: x[1].st_mtime)
 
-            file_to_keep = files_with_mtime[0][0]
+            file_to_keep = kept[0]
 
             # Удаляем остальные файлы
-            for file_path, _ in files_with_mtime[1:]:
+            for item in files:
+                if item is kept:
+                    continue
+                file_path = item[0]
                 try:
                     if not self.dry_run:
                         file_path.unlink()
+                        self.forget_file(file_path)
                         removed_count += 1
-                        logging.info(f"Удален дубликат: {file_path.name} (оригинал: {file_to_keep.name})")
+                        logging.info("Удален дубликат: %s (оригинал: %s)", file_path.name, file_to_keep.name)
                     else:
-                        logging.info(
-                            f"[DRY RUN] Был бы удален дубликат: {file_path.name} (оригинал: {file_to_keep.name})")
+                        logging.info("[DRY RUN] Был бы удален дубликат: %s (оригинал: %s)",
+                                     file_path.name, file_to_keep.name)
                 except Exception as e:
-                    logging.error(f"Не удалось удалить дубликат {file_path.name}: {e}")
+                    logging.error("Не удалось удалить дубликат %s: %s", file_path.name, e)
 
-        logging.info(f"Удалено дубликатов: {removed_count}")
+        logging.info("Удалено дубликатов: %d", removed_count)
         self.stats['duplicates_removed'] += removed_count
 
     def print_statistics(self):
@@ -364,8 +652,12 @@ class FileOrganizer:
         }
 
         if not self.dry_run:
-            with open(report_path, 'w', encoding='utf-8') as f:
-                json.dump(report, f, indent=2, ensure_ascii=False)
+            if orjson is not None:
+                report_path.write_bytes(
+                    orjson.dumps(report, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            else:
+                with open(report_path, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2, ensure_ascii=False, default=str)
             logging.info(f"Отчет сохранен: {report_path}")
 
 